@@ -5,6 +5,30 @@ import time
 import sys
 import random
 import logging
+import math
+import functools
+import threading
+import selectors
+
+# Cache of lookup results keyed by (domain, query type, server, port).
+# Each entry holds the IP list and the monotonic time at which it expires.
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+_CACHE_MAX_ENTRIES = 1024
+
+# Per-thread UDP sockets, already connected to their DNS server, and
+# receive buffers reused across lookups
+_LOCAL = threading.local()
+_RECV_BUF_SIZE = 4096  # Room for EDNS0 responses larger than 512 bytes
+
+# Precompiled packet layouts
+_HDR = struct.Struct('!HHHHHH')  # Header: ID, flags, QD/AN/NS/AR counts
+_RR = struct.Struct('!HHIH')     # Resource record: TYPE, CLASS, TTL, RDLENGTH
+_TID = struct.Struct('!H')       # Transaction ID at the start of the header
+_IPV4 = struct.Struct('!BBBB')   # A record RDATA: four address octets
+
+# Decimal strings for every octet value, used to format IPv4 addresses
+_BYTE_STR = tuple(str(i) for i in range(256))
 
 def setup_logging(verbose=False):
     """Setup logging configuration"""
@@ -15,21 +39,31 @@ def setup_logging(verbose=False):
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
+@functools.lru_cache(maxsize=1024)
 def convert_domain_to_dns_format(domain):
-    """Convert a domain name to DNS format (length byte + label)"""
-    dns_format = b''
+    """Convert a domain name to DNS format (length byte + label), memoized per domain"""
+    buf = bytearray()
     for part in domain.split('.'):
-        dns_format += bytes([len(part)]) + part.encode('ascii')
-    dns_format += b'\x00'  # Add terminating zero
-    logging.debug(f"Converted domain '{domain}' to DNS format: {dns_format}")
+        label = part.encode('ascii')
+        buf.append(len(label))
+        buf.extend(label)
+    buf.append(0)  # Add terminating zero
+    dns_format = bytes(buf)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Converted domain '%s' to DNS format: %r", domain, dns_format)
     return dns_format
 
+@functools.lru_cache(maxsize=64)
+def _query_struct(name_len):
+    """Return the layout of a whole query packet whose question name is name_len bytes"""
+    return struct.Struct(f'!HHHHHH{name_len}sHH')
+
 def create_dns_query(domain_name, query_type=1):  # Type 1 is A record
-    """Create a DNS query packet for the given domain_name"""
+    """Create a DNS query packet for the given domain_name, returned with its transaction ID"""
     
     # Generate random transaction ID
-    transaction_id = random.randint(0, 65535)
-    logging.debug(f"Generated transaction ID: {transaction_id}")
+    transaction_id = random.getrandbits(16)
+    logging.debug("Generated transaction ID: %d", transaction_id)
     
     # DNS Header fields
     flags = 0x0100  # Standard query with recursion desired
@@ -38,120 +72,331 @@ def create_dns_query(domain_name, query_type=1):  # Type 1 is A record
     nscount = 0     # No authority records
     arcount = 0     # No additional records
     
-    logging.debug(f"DNS Header - Flags: {flags}, QDCount: {qdcount}, ANCount: {ancount}")
-    
-    # Construct the header using struct
-    header = struct.pack('!HHHHHH', 
-                         transaction_id, 
-                         flags, 
-                         qdcount, 
-                         ancount, 
-                         nscount, 
-                         arcount)
+    logging.debug("DNS Header - Flags: %d, QDCount: %d, ANCount: %d", flags, qdcount, ancount)
     
-    # Construct the question section
-    question = convert_domain_to_dns_format(domain_name)
-    question += struct.pack('!HH', query_type, 1)  # QTYPE=A (1), QCLASS=IN (1)
+    # Pack the header, question name and QTYPE/QCLASS in a single call
+    question_name = convert_domain_to_dns_format(domain_name)
+    packet = _query_struct(len(question_name)).pack(transaction_id,
+                                                    flags,
+                                                    qdcount,
+                                                    ancount,
+                                                    nscount,
+                                                    arcount,
+                                                    question_name,
+                                                    query_type,  # QTYPE=A (1)
+                                                    1)           # QCLASS=IN (1)
     
-    logging.debug(f"Created DNS query packet for domain: {domain_name}")
-    return header + question
+    logging.debug("Created DNS query packet for domain: %s", domain_name)
+    return packet, transaction_id
 
-def parse_dns_response(response):
-    """Parse the raw DNS response and extract IPv4 addresses"""
+def parse_dns_response(response, expected_tid=None):
+    """Parse the raw DNS response (bytes or any buffer) and extract IPv4 addresses and the minimum answer TTL
+    
+    If expected_tid is given, a response carrying any other transaction ID
+    is rejected without being parsed and yields no addresses.
+    """
+    
+    # View the response without copying; every read below indexes or
+    # unpacks this view in place, so parsing makes no copies
+    if not isinstance(response, memoryview):
+        response = memoryview(response)
     
     # Unpack the header
-    header = struct.unpack('!HHHHHH', response[:12])
+    header = _HDR.unpack_from(response, 0)
     transaction_id, flags, qdcount, ancount, nscount, arcount = header
     
-    logging.debug(f"Parsing DNS response - Transaction ID: {transaction_id}")
-    logging.debug(f"Response counts - Questions: {qdcount}, Answers: {ancount}, Authority: {nscount}, Additional: {arcount}")
+    if expected_tid is not None and transaction_id != expected_tid:
+        logging.debug("Ignoring response with unexpected transaction ID: %d", transaction_id)
+        return [], 0
+    
+    logging.debug("Parsing DNS response - Transaction ID: %d", transaction_id)
+    logging.debug("Response counts - Questions: %d, Answers: %d, Authority: %d, Additional: %d",
+                  qdcount, ancount, nscount, arcount)
     
     # Skip the question section (find the end of it)
     offset = 12  # Start after the header
     
     # Skip domain name in question
-    while True:
-        length = response[offset]
-        if length == 0:
-            offset += 1
-            break
+    length = response[offset]
+    while length:
         offset += length + 1
+        length = response[offset]
+    offset += 1
     
     # Skip QTYPE and QCLASS (4 bytes)
     offset += 4
     
+    # Bind the answer loop's hot lookups locally
+    unpack_rr = _RR.unpack_from
+    unpack_ipv4 = _IPV4.unpack_from
+    byte_str = _BYTE_STR
+    
     # Parse answers
     ip_addresses = []
-    for i in range(ancount):
-        logging.debug(f"Parsing answer record {i+1}/{ancount}")
-        
+    min_ttl = None
+    for _ in range(ancount):
         # Check if this is a pointer to a domain name
-        if (response[offset] & 0xC0) == 0xC0:
-            logging.debug("Found domain name pointer")
+        length = response[offset]
+        if length >= 0xC0:
             # It's a pointer, skip 2 bytes
             offset += 2
         else:
-            # Skip the domain name
-            while True:
-                length = response[offset]
-                if length == 0:
-                    offset += 1
-                    break
+            # Skip the domain name, which may itself end in a pointer
+            while length and length < 0xC0:
                 offset += length + 1
+                length = response[offset]
+            offset += 2 if length else 1
         
         # Extract record type, class, TTL, and data length
-        record_type, record_class, ttl, data_len = struct.unpack('!HHIH', response[offset:offset+10])
-        offset += 10
+        record_type, record_class, ttl, data_len = unpack_rr(response, offset)
+        offset += _RR.size
+        
+        # Every record in the chain (e.g. a CNAME) bounds how long the answer holds
+        if min_ttl is None or ttl < min_ttl:
+            min_ttl = ttl
         
-        logging.debug(f"Record Type: {record_type}, Class: {record_class}, TTL: {ttl}, Data Length: {data_len}")
+        # Only A records (type 1) carry an IPv4 address, skip everything else
+        if record_type != 1 or data_len != 4:
+            offset += data_len
+            continue
         
-        # If it's an A record (type 1), extract the IP
-        if record_type == 1:  # A record
-            ip_bytes = response[offset:offset+data_len]
-            ip_address = '.'.join(str(b) for b in ip_bytes)
-            ip_addresses.append(ip_address)
-            logging.debug(f"Found A record with IP: {ip_address}")
+        a, b, c, d = unpack_ipv4(response, offset)
+        ip_address = f"{byte_str[a]}.{byte_str[b]}.{byte_str[c]}.{byte_str[d]}"
+        ip_addresses.append(ip_address)
         
         # Move to the next record
         offset += data_len
     
-    return ip_addresses
+    logging.debug("Found %d A record(s): %s, minimum TTL: %s", len(ip_addresses), ip_addresses, min_ttl)
+    return ip_addresses, min_ttl or 0
+
+def _cache_store(key, ip_addresses, ttl):
+    """Cache a lookup result for ttl seconds, dropping expired and excess entries"""
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        _CACHE.pop(key, None)
+        if len(_CACHE) >= _CACHE_MAX_ENTRIES:
+            for stale_key in [k for k, (_, expiry) in _CACHE.items() if expiry <= now]:
+                del _CACHE[stale_key]
+            # Still full: evict the oldest entries, which come first in the dict
+            while len(_CACHE) >= _CACHE_MAX_ENTRIES:
+                del _CACHE[next(iter(_CACHE))]
+        _CACHE[key] = (ip_addresses, now + ttl)
+
+def _set_recv_timeout(sock, timeout):
+    """Bound blocking receives on sock in the kernel with SO_RCVTIMEO, or block indefinitely if timeout is None"""
+    # The kernel reads zero as "wait forever", so round positive timeouts up
+    # to at least one unit rather than letting them truncate to zero
+    if sys.platform == 'win32':
+        millis = 0 if timeout is None else max(1, math.ceil(timeout * 1000))
+        value = struct.pack('L', millis)  # DWORD milliseconds
+    else:
+        micros = 0 if timeout is None else max(1, math.ceil(timeout * 1000000))
+        value = struct.pack('ll', *divmod(micros, 1000000))  # struct timeval
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, value)
+
+def _get_sock(dns_server, dns_port, timeout):
+    """Return this thread's UDP socket connected to the given DNS server, receiving with the given timeout"""
+    socks = getattr(_LOCAL, 'socks', None)
+    if socks is None:
+        socks = _LOCAL.socks = {}
+    entry = socks.get((dns_server, dns_port))
+    if entry is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            _set_recv_timeout(sock, timeout)
+            sock.connect((dns_server, dns_port))
+        except BaseException:
+            sock.close()
+            raise
+        # Each entry holds the socket and the receive timeout currently applied to it
+        socks[(dns_server, dns_port)] = [sock, timeout]
+        return sock
+    sock, applied_timeout = entry
+    if applied_timeout != timeout:
+        _set_recv_timeout(sock, timeout)
+        entry[1] = timeout
+    return sock
+
+def _get_recv_buf():
+    """Return this thread's reusable receive buffer"""
+    buf = getattr(_LOCAL, 'recv_buf', None)
+    if buf is None:
+        buf = _LOCAL.recv_buf = bytearray(_RECV_BUF_SIZE)
+    return buf
+
+def _close_sock(dns_server, dns_port):
+    """Close and forget this thread's socket for the given DNS server"""
+    entry = getattr(_LOCAL, 'socks', {}).pop((dns_server, dns_port), None)
+    if entry is not None:
+        entry[0].close()
 
-def dns_lookup(domain_name, dns_server='8.8.8.8', dns_port=53):
-    """Perform a DNS lookup for the given domain_name"""
+def dns_lookup(domain_name, dns_server='8.8.8.8', dns_port=53, timeout=5):
+    """Perform a DNS lookup for the given domain_name, waiting up to timeout seconds for the reply
     
-    logging.info(f"Starting DNS lookup for domain: {domain_name}")
-    logging.info(f"Using DNS server: {dns_server}:{dns_port}")
+    A timeout of None waits indefinitely.
+    """
     
-    # Create a UDP socket
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-        sock.settimeout(5)  # Set timeout to 5 seconds
-        
-        # Create DNS query
-        query = create_dns_query(domain_name)
-        
-        # Record start time
-        start_time = time.time()
-        
-        # Send the query
-        logging.debug(f"Sending DNS query to {dns_server}:{dns_port}")
-        sock.sendto(query, (dns_server, dns_port))
-        
-        # Receive the response
-        logging.debug("Waiting for DNS response...")
-        response, _ = sock.recvfrom(512)  # DNS messages are usually <= 512 bytes
-        
-        # Record end time
-        end_time = time.time()
-        
-        # Calculate query time in milliseconds
-        query_time_ms = int((end_time - start_time) * 1000)
-        logging.info(f"DNS query completed in {query_time_ms}ms")
+    if timeout is not None and timeout <= 0:
+        raise ValueError("timeout must be a positive number of seconds or None")
+    
+    logging.info("Starting DNS lookup for domain: %s", domain_name)
+    logging.info("Using DNS server: %s:%s", dns_server, dns_port)
+    
+    # Serve from the cache while the shortest TTL of the cached records holds
+    key = (domain_name, 1, dns_server, dns_port)
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                logging.info("Cache hit for domain: %s", domain_name)
+                return list(entry[0]), 0
+            del _CACHE[key]
+    
+    # Create DNS query
+    query, transaction_id = create_dns_query(domain_name)
+    recv_buf = _get_recv_buf()
+    
+    # Retry once on a fresh socket if the cached one has gone bad
+    for attempt in range(2):
+        sock = _get_sock(dns_server, dns_port, timeout)
+        try:
+            # Record start time
+            start_time = time.time()
+            
+            # Send the query
+            logging.debug("Sending DNS query to %s:%s", dns_server, dns_port)
+            sock.send(query)
+            
+            # Receive the response; the timeout bounds the whole wait, not each packet
+            logging.debug("Waiting for DNS response...")
+            deadline = None if timeout is None else time.monotonic() + timeout
+            nbytes = sock.recv_into(recv_buf)
+            
+            # Drop stray or late packets meant for an earlier query
+            while nbytes < _HDR.size or _TID.unpack_from(recv_buf, 0)[0] != transaction_id:
+                logging.debug("Ignoring response that does not match transaction ID: %d", transaction_id)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise socket.timeout("timed out")
+                    # The next lookup's _get_sock restores the full timeout
+                    sock = _get_sock(dns_server, dns_port, remaining)
+                nbytes = sock.recv_into(recv_buf)
+            
+            # Record end time
+            end_time = time.time()
+            break
+        except (socket.timeout, BlockingIOError):
+            # A late reply must not be read as the answer to the next query
+            _close_sock(dns_server, dns_port)
+            # SO_RCVTIMEO expiry surfaces as EAGAIN on POSIX
+            raise socket.timeout("timed out") from None
+        except OSError:
+            _close_sock(dns_server, dns_port)
+            if attempt:
+                raise
+    
+    # Calculate query time in milliseconds
+    query_time_ms = int((end_time - start_time) * 1000)
+    logging.info("DNS query completed in %dms", query_time_ms)
+    
+    # Parse the response
+    ip_addresses, ttl = parse_dns_response(memoryview(recv_buf)[:nbytes], transaction_id)
+    
+    if ip_addresses and ttl > 0:
+        _cache_store(key, ip_addresses, ttl)
+    
+    return list(ip_addresses), query_time_ms
+
+def dns_lookup_many(domain_names, dns_server='8.8.8.8', dns_port=53, timeout=5):
+    """Look up several domain names at once over a single UDP socket
+    
+    All queries are sent up front and the responses are matched back to
+    their domain by transaction ID. Domains that receive no answer before
+    the timeout, or whose reply cannot be parsed, map to an empty list.
+    """
+    
+    logging.info("Starting DNS lookup for %d domains", len(domain_names))
+    logging.info("Using DNS server: %s:%s", dns_server, dns_port)
+    
+    results = {}
+    recv_buf = _get_recv_buf()
+    pending = {}  # transaction ID -> domain name
+    
+    # Answer what we can from the cache first
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        for domain_name in domain_names:
+            entry = _CACHE.get((domain_name, 1, dns_server, dns_port))
+            if entry is not None and entry[1] > now:
+                results[domain_name] = list(entry[0])
+    
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock, \
+            selectors.DefaultSelector() as selector:
+        sock.setblocking(False)
+        # Connected, so the kernel drops datagrams from any other source
+        sock.connect((dns_server, dns_port))
+        selector.register(sock, selectors.EVENT_READ)
         
-        # Parse the response
-        ip_addresses = parse_dns_response(response)
+        # Send every query before waiting on any response
+        refused = False
+        for domain_name in dict.fromkeys(domain_names):
+            if domain_name in results:
+                continue
+            query, transaction_id = create_dns_query(domain_name)
+            while transaction_id in pending:
+                query, transaction_id = create_dns_query(domain_name)
+            logging.debug("Sending DNS query for %s to %s:%s", domain_name, dns_server, dns_port)
+            try:
+                sock.send(query)
+            except ConnectionRefusedError:
+                # ICMP port unreachable from an earlier query: nothing is listening
+                logging.warning("DNS server %s:%s refused the queries", dns_server, dns_port)
+                refused = True
+                break
+            pending[transaction_id] = domain_name
         
-        return ip_addresses, query_time_ms
+        # Collect responses until every query is answered or we run out of time
+        deadline = time.monotonic() + timeout
+        while pending and not refused:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not selector.select(remaining):
+                continue
+            
+            try:
+                nbytes = sock.recv_into(recv_buf)
+            except ConnectionRefusedError:
+                # ICMP port unreachable: nothing is listening for the remaining queries
+                logging.warning("DNS server %s:%s refused the queries", dns_server, dns_port)
+                break
+            if nbytes < _HDR.size:
+                continue
+            response = memoryview(recv_buf)[:nbytes]
+            transaction_id = _TID.unpack_from(response, 0)[0]
+            domain_name = pending.pop(transaction_id, None)
+            if domain_name is None:
+                logging.debug("Ignoring response with unknown transaction ID: %d", transaction_id)
+                continue
+            
+            try:
+                ip_addresses, ttl = parse_dns_response(response, transaction_id)
+            except (IndexError, struct.error) as e:
+                logging.warning("Malformed DNS response for domain %s: %s", domain_name, e)
+                results[domain_name] = []
+                continue
+            results[domain_name] = list(ip_addresses)
+            if ip_addresses and ttl > 0:
+                _cache_store((domain_name, 1, dns_server, dns_port), ip_addresses, ttl)
+    
+    for domain_name in dict.fromkeys(domain_names):
+        if domain_name not in results:
+            logging.warning("No DNS response received for domain: %s", domain_name)
+            results[domain_name] = []
+    
+    return {domain_name: results[domain_name] for domain_name in domain_names}
 
 def main():
     # Check command line arguments
@@ -175,7 +420,7 @@ def main():
         print(f"IP addresses for {domain_name}: {ip_addresses}")
         print(f"Query time: {query_time} ms")
     except Exception as e:
-        logging.error(f"Error during DNS lookup: {e}")
+        logging.error("Error during DNS lookup: %s", e)
         print(f"Error: {e}")
         sys.exit(1)
 
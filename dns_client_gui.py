@@ -2,25 +2,30 @@
 import sys
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QLineEdit, QPushButton, QLabel, QListWidget, QFrame)
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt, QObject, QRunnable, QThreadPool, Signal
 from PySide6.QtGui import QFont
-from dns_client import dns_lookup
 
-class DNSLookupThread(QThread):
-    """Thread for performing DNS lookups without freezing the GUI"""
+class DNSLookupSignals(QObject):
+    """Signals emitted by DNS lookup tasks back to the GUI thread"""
     finished = Signal(list, int)
     error = Signal(str)
 
-    def __init__(self, domain):
+class DNSLookupTask(QRunnable):
+    """Pooled task for performing DNS lookups without freezing the GUI"""
+
+    def __init__(self, domain, signals):
         super().__init__()
         self.domain = domain
+        self.signals = signals
 
     def run(self):
+        # Imported on first lookup so it stays off the window's startup path
+        from dns_client import dns_lookup
         try:
             ip_addresses, query_time = dns_lookup(self.domain)
-            self.finished.emit(ip_addresses, query_time)
+            self.signals.finished.emit(ip_addresses, query_time)
         except Exception as e:
-            self.error.emit(str(e))
+            self.signals.error.emit(str(e))
 
 class StyledLineEdit(QLineEdit):
     def __init__(self, placeholder=""):
@@ -93,6 +98,11 @@ class DNSClientGUI(QMainWindow):
         self.setMinimumSize(500, 600)
         self.setup_ui()
 
+        # Lookups run on the shared thread pool and report back through one signals object
+        self.lookup_signals = DNSLookupSignals()
+        self.lookup_signals.finished.connect(self.handle_results)
+        self.lookup_signals.error.connect(self.handle_error)
+
     def setup_ui(self):
         # Create central widget and layout
         central_widget = QWidget()
@@ -185,11 +195,8 @@ class DNSClientGUI(QMainWindow):
         self.results_label.setStyleSheet("color: #3498DB;")
         self.lookup_button.setEnabled(False)
 
-        # Create and start lookup thread
-        self.lookup_thread = DNSLookupThread(domain)
-        self.lookup_thread.finished.connect(self.handle_results)
-        self.lookup_thread.error.connect(self.handle_error)
-        self.lookup_thread.start()
+        # Hand the lookup to the shared thread pool
+        QThreadPool.globalInstance().start(DNSLookupTask(domain, self.lookup_signals))
 
     def handle_results(self, ip_addresses, query_time):
         """Handle successful DNS lookup results"""